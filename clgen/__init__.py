@@ -81,7 +81,8 @@ class CLgenObject(object):
     """
     Base object for CLgen classes.
     """
-    pass
+    # Allow subclasses to declare __slots__.
+    __slots__ = ()
 
 
 def version() -> str:
@@ -20,9 +20,13 @@
 Converting & encoding text streams into vocabularies for machine learning.
 """
 import numpy as np
+import os
+import re
 import string
+import sys
 
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 import clgen
 
@@ -140,6 +144,16 @@ OPENCL_ATOMS = set([
     'write_only',
 ] + list(string.printable))
 
+# Vocabulary of OPENCL_ATOMS, used to bootstrap GreedyAtomizer.from_text().
+_OPENCL_VOCAB = dict((atom, i) for i, atom in enumerate(OPENCL_ATOMS))
+
+# Lazily constructed atomizer for _OPENCL_VOCAB. See _opencl_atomizer().
+_OPENCL_ATOMIZER = None
+
+# Minimum text length (in characters) to split across worker processes when
+# collecting the unique tokens of a corpus.
+_PARALLEL_MIN_TEXT_LEN = 1 << 20
+
 
 class VocabError(clgen.CLgenError):
     """A character sequence is not in the atomizer's vocab"""
@@ -156,19 +170,39 @@ class Atomizer(clgen.CLgenObject):
             vocab (dict): A dictionary of string -> integer mappings to use for
                 atomizing text from atoms into indices.
         """
-        assert(isinstance(vocab, dict))
-
         self.vocab = vocab
         self.vocab_size = len(self.vocab)
-        self.decoder = dict((val, key) for key, val in vocab.items())
+        self.decoder = {val: key for key, val in vocab.items()}
+
+        # Dense list of atoms, indexed by vocabulary index. Any unused
+        # indices are None. Atoms are interned, so that decoded strings
+        # share a single copy of each atom.
+        self._decoder_list = [None] * (max(self.decoder, default=-1) + 1)
+        for key, val in vocab.items():
+            self._decoder_list[val] = sys.intern(key)
+
+        self._atoms = list(sorted(self.vocab.keys()))
+        self._indices = list(sorted(self.vocab.values()))
+
+        # Narrowest integer type for atomized text. The maximum value of the
+        # type is reserved as an invalid index.
+        if len(self._decoder_list) < np.iinfo(np.uint16).max:
+            self._idx_dtype = np.uint16
+        else:
+            self._idx_dtype = np.int32
+
+    def __setstate__(self, state: dict):
+        # Rebuild derived state from the vocabulary, rather than trusting
+        # the pickled attributes, which may predate them.
+        self.__init__(state["vocab"])
 
     @property
     def atoms(self):
-        return list(sorted(self.vocab.keys()))
+        return self._atoms
 
     @property
     def indices(self):
-        return list(sorted(self.vocab.values()))
+        return self._indices
 
     def atomize(self, text: str) -> np.array:
         """
@@ -178,10 +212,57 @@ class Atomizer(clgen.CLgenObject):
             text (str): Input text.
 
         Returns:
-            np.array: Indices into vocabulary for all atoms in text.
+            np.array: Indices into vocabulary for all atoms in text. The array
+                is of the narrowest integer type which can hold every index,
+                typically uint16, so consumers which require a specific type
+                should cast it.
         """
         raise NotImplementedError("abstract class")
 
+    def atomize_iter(self, text_iter, chunk_size: int=1 << 20):
+        """
+        Atomize a stream of text, in chunks.
+
+        Text is buffered until at least chunk_size characters are available,
+        and then atomized. This bounds memory usage when encoding corpora
+        which are too large to atomize in one go.
+
+        Arguments:
+            text_iter (iterable of str): Input text, e.g. an open file.
+            chunk_size (int, optional): Number of characters to buffer before
+                atomizing.
+
+        Returns:
+            iterable of np.array: Indices into vocabulary. Concatenated, these
+                are the same as atomizing the entire text.
+        """
+        buf, buflen = [], 0
+        for text in text_iter:
+            buf.append(text)
+            buflen += len(text)
+            if buflen >= chunk_size:
+                indices, remainder = self._atomize_chunk(''.join(buf))
+                yield indices
+                buf, buflen = [remainder], len(remainder)
+
+        text = ''.join(buf)
+        if text:
+            yield self.atomize(text)
+
+    def _atomize_chunk(self, text: str) -> tuple:
+        """
+        Atomize a chunk of text which may be followed by more text.
+
+        Arguments:
+            text (str): Input text.
+
+        Returns:
+            (np.array, str): Indices into vocabulary for the atomized text, and
+                the text which cannot be atomized until the text following it
+                is known.
+        """
+        return self.atomize(text), ''
+
     def tokenize(self, text: str) -> list:
         """
         Atomize a text into an array of atomsself.
@@ -192,8 +273,8 @@ class Atomizer(clgen.CLgenObject):
         Returns:
             list of str: Atom strings.
         """
-        indices = self.atomize(text)
-        return list(map(lambda x: self.decoder[x], indices))
+        decoder = self._decoder_list
+        return [decoder[x] for x in self.atomize(text)]
 
     def deatomize(self, encoded: np.array) -> str:
         """
@@ -205,9 +286,13 @@ class Atomizer(clgen.CLgenObject):
         Returns:
             str: Decoded text.
         """
+        decoder = self._decoder_list
         try:
-            return ''.join(list(map(lambda x: self.decoder[x], encoded)))
-        except KeyError:
+            # Negative indices are mapped to None, rather than being
+            # counted from the end of the decoder.
+            return ''.join([decoder[x] if x >= 0 else None for x in encoded])
+        except (IndexError, TypeError):
+            # Index out of range, or an unused index (None) in the decoder.
             raise VocabError
 
     @staticmethod
@@ -231,18 +316,32 @@ class CharacterAtomizer(Atomizer):
     def __init__(self, *args, **kwargs):
         super(CharacterAtomizer, self).__init__(*args, **kwargs)
 
+        # Lookup table of character ordinals to vocabulary indices. Ordinals
+        # which are not in the vocabulary map to the maximum index value.
+        maxord = max((ord(c) for c in self.vocab), default=-1)
+        self._invalid_idx = np.iinfo(self._idx_dtype).max
+        self._lut = np.full(maxord + 1, self._invalid_idx,
+                            dtype=self._idx_dtype)
+        for c, i in self.vocab.items():
+            self._lut[ord(c)] = i
+
     def atomize(self, text: str) -> np.array:
-        try:
-            return np.array(list(map(lambda x: self.vocab[x], text)))
-        except KeyError:
+        # Decode the text to an array of unicode code points, and gather
+        # vocabulary indices from the lookup table in a single pass.
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        if codes.size and codes.max() >= len(self._lut):
+            raise VocabError
+
+        indices = self._lut[codes]
+        if (indices == self._invalid_idx).any():
             raise VocabError
+        return indices
 
     @staticmethod
     def from_text(text: str) -> Atomizer:
-        counter = Counter(text)
-        count_pairs = sorted(counter.items(), key=lambda x: -x[1])
-        atoms, _ = zip(*count_pairs)
-        vocab = dict(zip(atoms, range(len(atoms))))
+        # Characters are indexed in order of descending frequency.
+        vocab = dict((c, i) for i, (c, _) in
+                     enumerate(Counter(text).most_common()))
         return CharacterAtomizer(vocab)
 
 
@@ -253,48 +352,155 @@ class GreedyAtomizer(Atomizer):
     def __init__(self, *args, **kwargs):
         super(GreedyAtomizer, self).__init__(*args, **kwargs)
         multichars = set(k for k in self.atoms if len(k) > 1)
-        first_chars = set(a[0] for a in multichars)
-        self.lookup = dict((c, [a for a in multichars if a[0] == c])
-                           for c in first_chars)
+
+        # Multi-character atoms are matched by a regex in the shape of their
+        # prefix trie, falling back to a single character. At each position
+        # the regex engine follows at most one branch per character, and
+        # greedy optional groups backtrack to the longest complete atom.
+        #
+        # Most characters cannot start a multi-character atom, so the
+        # pattern is guarded by a lookahead on the set of first characters.
+        # The regex engine tests this with a single bitmap lookup.
+        pattern = '.'
+        if multichars:
+            starts = ''.join(sorted(set(a[0] for a in multichars)))
+            pattern = '(?=[{starts}]){trie}|.'.format(
+                starts=re.escape(starts), trie=_trie_pattern(multichars))
+        self._pattern = re.compile(pattern, re.DOTALL)
+        self._max_atom_len = max((len(a) for a in self.atoms), default=1)
 
     def atomize(self, text: str) -> np.array:
-        indices = []
-        i = 0
-        j = 2
+        return self._encode(self._pattern.findall(text))
+
+    def _atomize_chunk(self, text: str) -> tuple:
+        # An atom which starts within _max_atom_len characters of the end of
+        # the chunk may be extended by the text which follows it, so these
+        # atoms are carried over to the next chunk.
+        atoms = self._pattern.findall(text)
+        limit = len(text) - self._max_atom_len
+        end = len(text)
+        while atoms and end - len(atoms[-1]) > limit:
+            end -= len(atoms.pop())
+        return self._encode(atoms), text[end:]
+
+    def _encode(self, atoms: list) -> np.array:
+        # Since the number of atoms is known up front, the output array is
+        # allocated once and filled in place.
         try:
-            while i < len(text):
-                if self.lookup.get(text[i]):
-                    if j <= len(text) and any(x.startswith(text[i:j])
-                                              for x in self.lookup[text[i]]):
-                        j += 1
-                    else:
-                        while j > i + 1:
-                            if any(x == text[i:j]
-                                   for x in self.lookup[text[i]]):
-                                indices.append(self.vocab[text[i:j]])
-                                i = j
-                                j = j + 2
-                                break
-                            else:
-                                j -= 1
-                        else:
-                            indices.append(self.vocab[text[i]])
-                            i = i + 1
-                            j = j + 2
-                else:
-                    indices.append(self.vocab[text[i]])
-                    i = i + 1
-                    j = j + 2
+            return np.fromiter(map(self.vocab.__getitem__, atoms),
+                               dtype=self._idx_dtype, count=len(atoms))
         except KeyError:
             raise VocabError
 
-        return np.array(indices)
-
     @staticmethod
     def from_text(text: str) -> Atomizer:
-        opencl_vocab = dict(zip(OPENCL_ATOMS, range(len(OPENCL_ATOMS))))
-        c = GreedyAtomizer(opencl_vocab)
-
-        tokens = sorted(list(set(c.tokenize(text))))
+        tokens = sorted(list(_opencl_unique_tokens(text)))
         vocab = dict(zip(tokens, range(len(tokens))))
         return GreedyAtomizer(vocab)
+
+
+def _trie_pattern(atoms) -> str:
+    """
+    Build a regular expression which matches the longest of a set of atoms.
+
+    The expression is structured as the prefix trie of the atoms, e.g.
+    ['ab', 'abcd', 'ac'] produces 'a(?:b(?:cd)?|c)'.
+
+    Arguments:
+        atoms (iterable of str): Atoms to match. Must not be empty.
+
+    Returns:
+        str: Regular expression.
+    """
+    trie = {}
+    for atom in atoms:
+        node = trie
+        for c in atom:
+            node = node.setdefault(c, {})
+        node[''] = {}  # end of atom
+
+    def pattern(node):
+        edges = [(c, child) for c, child in sorted(node.items()) if c]
+        if not edges:
+            return ''
+        elif len(edges) == 1 and '' not in node:
+            c, child = edges[0]
+            return re.escape(c) + pattern(child)
+        else:
+            group = '(?:{})'.format('|'.join(
+                re.escape(c) + pattern(child) for c, child in edges))
+            return group + '?' if '' in node else group
+
+    return pattern(trie)
+
+
+def _opencl_atomizer() -> GreedyAtomizer:
+    """
+    Get the greedy atomizer for OPENCL_ATOMS.
+
+    The atomizer is constructed on first use and shared by subsequent
+    calls.
+
+    Returns:
+        GreedyAtomizer: Atomizer for _OPENCL_VOCAB.
+    """
+    global _OPENCL_ATOMIZER
+    if _OPENCL_ATOMIZER is None:
+        _OPENCL_ATOMIZER = GreedyAtomizer(_OPENCL_VOCAB)
+    return _OPENCL_ATOMIZER
+
+
+def _unique_tokens(atomizer: Atomizer, text: str) -> set:
+    """
+    Get the set of unique tokens in a text.
+
+    Arguments:
+        atomizer (Atomizer): Atomizer.
+        text (str): Input text.
+
+    Returns:
+        set of str: Atom strings.
+    """
+    return set(atomizer.tokenize(text))
+
+
+def _opencl_unique_tokens(text: str, n_workers: int=None,
+                          min_text_len: int=_PARALLEL_MIN_TEXT_LEN) -> set:
+    """
+    Get the set of unique OpenCL tokens in a text, using multiple processes.
+
+    The text is split into chunks at newlines, which are tokenized in
+    parallel. No multi-character OpenCL atom contains a newline, so the
+    union of the tokens in each chunk is the same as those of the text.
+    This does not hold for arbitrary vocabularies, so the OpenCL atomizer
+    is always used.
+
+    Arguments:
+        text (str): Input text.
+        n_workers (int, optional): Number of worker processes. Defaults to
+            the number of CPUs.
+        min_text_len (int, optional): Texts shorter than this are tokenized
+            in the calling process.
+
+    Returns:
+        set of str: Atom strings.
+    """
+    atomizer = _opencl_atomizer()
+
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_workers < 2 or len(text) < min_text_len:
+        return _unique_tokens(atomizer, text)
+
+    chunk_size = len(text) // n_workers + 1
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start + chunk_size)
+        end = len(text) if end == -1 else end + 1
+        chunks.append(text[start:end])
+        start = end
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        results = executor.map(_unique_tokens,
+                               [atomizer] * len(chunks), chunks)
+        return set().union(*results)
@@ -25,7 +25,6 @@ import os
 import sys
 
 from copy import deepcopy
-from functools import partial
 from io import open
 from labm8 import fs
 from labm8 import math as labmath
@@ -155,7 +154,8 @@ def device_type_matches(device, devtype) -> bool:
     return actual == devtype
 
 
-def init_opencl(devtype="__placeholder__", queue_flags=0):
+def init_opencl(devtype="__placeholder__", queue_flags=0,
+                out_of_order: bool=False):
     """
     Initialise an OpenCL for a requested device type.
 
@@ -169,6 +169,9 @@ def init_opencl(devtype="__placeholder__", queue_flags=0):
             Default: gpu.
         queue_flags (cl.command_queue_properties, optional): Bitfield of
             OpenCL queue constructor options.
+        out_of_order (bool, optional): If True, and the device supports it,
+            the queue uses out-of-order execution. Commands enqueued on it
+            must then express their dependencies using event wait lists.
 
     Returns:
         (cl.Context, cl.Queue): Tuple of OpenCL context and device queue.
@@ -194,7 +197,11 @@ def init_opencl(devtype="__placeholder__", queue_flags=0):
         for device in devices:
             if device_type_matches(device, devtype):
                 queue_flags |= cl.command_queue_properties.PROFILING_ENABLE
-                queue = cl.CommandQueue(ctx, properties=queue_flags)
+                ooo = cl.command_queue_properties.OUT_OF_ORDER_EXEC_MODE_ENABLE
+                if out_of_order and device.queue_properties & ooo:
+                    queue_flags |= ooo
+                queue = cl.CommandQueue(ctx, device=device,
+                                        properties=queue_flags)
 
                 return ctx, queue
 
@@ -229,6 +236,122 @@ def get_event_time(event) -> float:
         raise E_BAD_PROFILE
 
 
+def get_events_time(events: list) -> float:
+    """
+    Block until all OpenCL events have completed and return the time delta
+    between the first event starting and the last event ending, in
+    milliseconds.
+
+    Unlike calling get_event_time() on each event in turn, this waits on
+    the events once, allowing them to execute concurrently. Time during
+    which events overlap is counted once.
+
+    Arguments:
+        events (cl.Event[]): Event handles.
+
+    Returns:
+        float: Elapsed time, in milliseconds.
+
+    Raises:
+        E_BAD_PROFILE: In case of error.
+    """
+    if not events:
+        return 0
+
+    try:
+        cl.wait_for_events(events)
+        tstart = min(event.profile.start for event in events)
+        tend = max(event.profile.end for event in events)
+        return (tend - tstart) / 1000000
+    except Exception:
+        raise E_BAD_PROFILE
+
+
+def pack_buffers(ctx, args: list) -> tuple:
+    """
+    Allocate device memory for the global buffer arguments of a payload.
+
+    The host data of every argument with hostdata is copied into a single
+    contiguous staging array, and each argument's hostdata is replaced with
+    a view into it. The device buffers are sub-buffers of a single backing
+    buffer with the same layout, so the whole payload can be uploaded with
+    one transfer. Offsets are aligned to the devices' base address
+    alignment, as required for sub-buffers.
+
+    Arguments:
+        ctx (cl.Context): OpenCL context.
+        args (KernelArg[]): Kernel arguments. Arguments with hostdata must
+            have flags set.
+
+    Returns:
+        (np.array, cl.Buffer): Staging array and backing buffer, or
+            (None, None) if there are no buffer arguments.
+    """
+    bufargs = [arg for arg in args if arg.hostdata is not None]
+    if not bufargs:
+        return None, None
+
+    # mem_base_addr_align is given in bits.
+    align = max(device.mem_base_addr_align for device in ctx.devices) // 8
+
+    offsets = []
+    nbytes = 0
+    for arg in bufargs:
+        offsets.append(nbytes)
+        nbytes += -(-arg.hostdata.nbytes // align) * align
+
+    staging = np.empty(nbytes, dtype=np.uint8)
+    backing = cl.Buffer(ctx, cl.mem_flags.READ_WRITE, size=nbytes)
+
+    for arg, offset in zip(bufargs, offsets):
+        size = arg.hostdata.nbytes
+        view = staging[offset:offset + size].view(arg.hostdata.dtype)
+        np.copyto(view, arg.hostdata)
+        arg.hostdata = view
+        arg.devdata = backing.get_sub_region(offset, size, arg.flags)
+
+    return staging, backing
+
+
+# Random number generator for payloads.
+_rng = np.random.default_rng()
+
+
+def sequential_array(n: int, dtype) -> np.array:
+    """
+    Create an array of sequential values 0, 1, ..., n - 1.
+
+    Arguments:
+        n (int): Number of elements.
+        dtype (numpy type): Element type.
+
+    Returns:
+        np.array: Array of values.
+    """
+    # numpy can only generate boolean ranges of length <= 2 directly.
+    if dtype is np.bool_:
+        return np.arange(n).astype(dtype)
+    return np.arange(n, dtype=dtype)
+
+
+def random_array(n: int, dtype) -> np.array:
+    """
+    Create an array of random values in the range [0, 1), converted to type.
+
+    Arguments:
+        n (int): Number of elements.
+        dtype (numpy type): Element type.
+
+    Returns:
+        np.array: Array of values.
+    """
+    # Floating point values are generated directly in the requested
+    # precision. Other types are generated as doubles and converted.
+    if dtype in (np.float32, np.float64):
+        return _rng.random(n, dtype=dtype)
+    return _rng.random(n).astype(dtype)
+
+
 class KernelPayload(clgen.CLgenObject):
     """
     Abstraction of data for OpenCL kernel.
@@ -237,6 +360,9 @@ class KernelPayload(clgen.CLgenObject):
         """
         Create a kernel payload.
 
+        Device memory for arguments with host data is allocated here, see
+        pack_buffers().
+
         Arguments:
             ctx (cl.Context): OpenCL context.
             args (KernelArg[]): Kernel arguments.
@@ -252,13 +378,15 @@ class KernelPayload(clgen.CLgenObject):
         self._args = args
         self._ndrange = ndrange
         self._transfersize = transfersize
+        self._staging, self._backing = pack_buffers(ctx, args)
+        self._kargs = tuple(a.devdata for a in args)
 
-    def __deepcopy__(self, memo: dict={}):
+    def __deepcopy__(self, memo: dict=None):
         """
         Make a deep copy of a payload.
 
         This means duplicating all host data, and constructing new
-        OpenCL mem objects with pointers to this host data. Note that
+        OpenCL mem objects for the copy. Note that
         this DOES NOT copy the OpenCL context associated with the
         payload.
 
@@ -266,7 +394,7 @@ class KernelPayload(clgen.CLgenObject):
             KernelPayload: A new kernel payload instance containing copies of
                 all data.
         """
-        args = [clutil.KernelArg(a.string) for a in self.args]
+        args = [a.shallow_clone() for a in self.args]
 
         for src, dst in zip(self.args, args):
             if src.hostdata is None and src.is_local:
@@ -275,19 +403,35 @@ class KernelPayload(clgen.CLgenObject):
                 dst.bufsize = src.bufsize
                 dst.devdata = cl.LocalMemory(src.bufsize)
             elif src.hostdata is None:
-                # Copy a scalar value.
+                # Copy a scalar value. Numpy scalars are immutable, so may
+                # be shared.
                 dst.hostdata = None
-                dst.devdata = deepcopy(src.devdata)
+                dst.devdata = src.devdata
             else:
-                # Copy a global memory buffer.
-                dst.hostdata = deepcopy(src.hostdata, memo=memo)
+                # Copy a global memory buffer. The host data is copied, and
+                # the device buffer allocated, by the KernelPayload
+                # constructor. The device buffer is not initialised, since
+                # host_to_device() uploads it before use.
+                dst.hostdata = src.hostdata
                 dst.flags = src.flags
-                dst.devdata = cl.Buffer(self.context, src.flags,
-                                        hostbuf=dst.hostdata)
 
         return KernelPayload(
             self.context, args, self.ndrange, self.transfersize)
 
+    def reset_from(self, other) -> None:
+        """
+        Reset payload data in place from another payload.
+
+        Host data is copied into this payload's existing arrays, and the
+        OpenCL mem objects are kept, so no new buffers are allocated. Both
+        payloads must have been created for the same kernel and size.
+
+        Arguments:
+            other (KernelPayload): Payload to copy data from.
+        """
+        if self._staging is not None:
+            np.copyto(self._staging, other._staging)
+
     def __eq__(self, other) -> bool:
         """
         Equality comparison. Checks that OpenCL context and arguments match.
@@ -312,11 +456,8 @@ class KernelPayload(clgen.CLgenObject):
             if x.hostdata is None:
                 if x.devdata != y.devdata:
                     return False
-            else:
-                if len(x.hostdata) != len(y.hostdata):
-                    return False
-                if any(e1 != e2 for e1, e2 in zip(x.hostdata, y.hostdata)):
-                    return False
+            elif not np.array_equal(x.hostdata, y.hostdata):
+                return False
         return True
 
     def __ne__(self, other) -> bool:
@@ -331,51 +472,45 @@ class KernelPayload(clgen.CLgenObject):
         """
         return not self.__eq__(other)
 
-    def host_to_device(self, queue) -> float:
+    def host_to_device(self, queue, wait_for: list=None) -> list:
         """
-        Transfer payload from host to device.
+        Enqueue transfer of payload from host to device.
 
         Arguments:
             queue (cl.Queue): Device Queue.
+            wait_for (cl.Event[], optional): Events to complete before
+                the transfer starts.
 
         Returns:
-            float: Elapsed time, in milliseconds.
+            cl.Event[]: Transfer events.
         """
         assert(isinstance(queue, cl.CommandQueue))
-        elapsed = 0
-
-        for arg in self.args:
-            if arg.hostdata is None:
-                continue
 
-            event = cl.enqueue_copy(queue, arg.devdata, arg.hostdata,
-                                    is_blocking=False)
-            elapsed += get_event_time(event)
+        if self._staging is None:
+            return []
 
-        return elapsed
+        # Upload all buffers at once, using the packed staging array.
+        return [cl.enqueue_copy(queue, self._backing, self._staging,
+                                is_blocking=False, wait_for=wait_for)]
 
-    def device_to_host(self, queue):
+    def device_to_host(self, queue, wait_for: list=None) -> list:
         """
-        Transfer payload from device to host.
+        Enqueue transfer of payload from device to host.
 
         Arguments:
             queue (cl.Queue): Device Queue.
+            wait_for (cl.Event[], optional): Events to complete before
+                the transfers start.
 
         Returns:
-            float: Elapsed time, in milliseconds.
+            cl.Event[]: Transfer events.
         """
         assert(isinstance(queue, cl.CommandQueue))
-        elapsed = 0
-
-        for arg in self.args:
-            if arg.hostdata is None or arg.is_const:
-                continue
 
-            event = cl.enqueue_copy(queue, arg.hostdata, arg.devdata,
-                                    is_blocking=False)
-            get_event_time(event)
-
-        return elapsed
+        return [cl.enqueue_copy(queue, arg.hostdata, arg.devdata,
+                                is_blocking=False, wait_for=wait_for)
+                for arg in self.args
+                if arg.hostdata is not None and not arg.is_const]
 
     @property
     def context(self):
@@ -390,7 +525,7 @@ class KernelPayload(clgen.CLgenObject):
     @property
     def kargs(self):
         """ Device data for arguments. """
-        return [a.devdata for a in self.args]
+        return self._kargs
 
     @property
     def ndrange(self):
@@ -430,7 +565,8 @@ class KernelPayload(clgen.CLgenObject):
         Create a payload.
 
         Arguments:
-            nparray (function): Numpy array generator.
+            nparray (function): Numpy array generator, which takes the
+                number of elements and the numpy type as arguments.
             driver (KernelDriver): Driver.
             size (int): Payload size parameter.
 
@@ -444,52 +580,50 @@ class KernelPayload(clgen.CLgenObject):
         assert(isinstance(driver, KernelDriver))
         assert(isinstance(size, Number))
 
-        args = [clutil.KernelArg(arg.string) for arg in driver.prototype.args]
         transfer = 0
 
+        # Buffer creation flags, and the number of times a buffer is
+        # transferred per run, indexed by whether the buffer is const. If
+        # it's a const buffer, we're not reading back to host.
+        buffer_kinds = {
+            True: (cl.mem_flags.READ_ONLY, 1),
+            False: (cl.mem_flags.READ_WRITE, 2),
+        }
+
         try:
-            for arg in args:
+            args = []
+            for (spec, dtype, vector_width, is_pointer, is_local,
+                 is_const) in driver.arg_specs:
+                # Copy the driver's parsed argument, rather than parsing
+                # its string again for every payload.
+                arg = spec.shallow_clone()
                 arg.hostdata = None
+                args.append(arg)
 
-                dtype = arg.numpy_type
-                veclength = size * arg.vector_width
+                veclength = size * vector_width
+                nbytes = veclength * np.dtype(dtype).itemsize
 
-                if arg.is_pointer and arg.is_local:
+                if is_pointer and is_local:
                     # If arg is a pointer to local memory, then we
                     # create a read/write buffer:
-                    nonbuf = nparray(veclength)
-                    arg.bufsize = nonbuf.nbytes
+                    arg.bufsize = nbytes
                     arg.devdata = cl.LocalMemory(arg.bufsize)
-                elif arg.is_pointer:
+                elif is_pointer:
                     # If arg is a pointer to global memory, then we
-                    # allocate host memory and populate with values:
-                    arg.hostdata = nparray(veclength).astype(dtype)
-
-                    # Determine flags to pass to OpenCL buffer creation:
-                    arg.flags = cl.mem_flags.COPY_HOST_PTR
-                    if arg.is_const:
-                        arg.flags |= cl.mem_flags.READ_ONLY
-                    else:
-                        arg.flags |= cl.mem_flags.READ_WRITE
-
-                    # Allocate device memory:
-                    arg.devdata = cl.Buffer(
-                        driver.context, arg.flags, hostbuf=arg.hostdata)
-
-                    # Record transfer overhead. If it's a const buffer,
-                    # we're not reading back to host.
-                    if arg.is_const:
-                        transfer += arg.hostdata.nbytes
-                    else:
-                        transfer += 2 * arg.hostdata.nbytes
+                    # allocate host memory and populate with values.
+                    # Device memory is allocated by the KernelPayload
+                    # constructor:
+                    arg.flags, ntransfers = buffer_kinds[is_const]
+                    transfer += ntransfers * nbytes
+                    arg.hostdata = nparray(veclength, dtype)
                 else:
                     # If arg is not a pointer, then it's a scalar value:
                     arg.devdata = dtype(size)
+
+            return KernelPayload(driver.context, args, (size,), transfer)
         except Exception as e:
             raise E_BAD_ARGS(e)
 
-        return KernelPayload(driver.context, args, (size,), transfer)
-
     @staticmethod
     def create_sequential(driver, size):
         """
@@ -505,7 +639,7 @@ class KernelPayload(clgen.CLgenObject):
         Raises:
             E_BAD_ARGS: If payload can't be synthesized for kernel argument(s).
         """
-        return KernelPayload._create_payload(np.arange, driver, size)
+        return KernelPayload._create_payload(sequential_array, driver, size)
 
     @staticmethod
     def create_random(driver, size):
@@ -522,7 +656,7 @@ class KernelPayload(clgen.CLgenObject):
         Raises:
             E_BAD_ARGS: If payload can't be synthesized for kernel argument(s).
         """
-        return KernelPayload._create_payload(np.random.rand, driver, size)
+        return KernelPayload._create_payload(random_array, driver, size)
 
 
 class KernelDriver(clgen.CLgenObject):
@@ -555,6 +689,9 @@ class KernelDriver(clgen.CLgenObject):
         self._kernel = kernels[0]
         self._name = self._kernel.get_info(cl.kernel_info.FUNCTION_NAME)
 
+        # Argument properties used to create payloads. Parsed on first use.
+        self._arg_specs = None
+
         # Profiling stats
         self._wgsizes = []
         self._transfers = []
@@ -578,17 +715,56 @@ class KernelDriver(clgen.CLgenObject):
         assert(type(queue) == cl.CommandQueue)
         assert(type(payload) == KernelPayload)
 
-        # First off, let's clear any existing tasks in the command
-        # queue:
-        queue.flush()
+        output, run = self._submit(queue, payload)
+        self._complete(output, run)
+        return output
 
-        elapsed = 0
+    def _submit(self, queue, payload, wait_for: list=None):
+        """
+        Enqueue a kernel run on a copy of a payload, without waiting for it.
+
+        Arguments:
+            queue (cl.Queue): Device queue.
+            payload (KernelPayload): Input payload.
+            wait_for (cl.Event[], optional): Events to complete before the
+                run starts on the device.
+
+        Returns:
+            (KernelPayload, (int, cl.Event[], cl.Event[])): Output
+                payload, and the run to pass to _complete().
+
+        Raises:
+            E_BAD_ARGS: If payload input does not match kernel arguments.
+        """
         output = deepcopy(payload)
+        return output, self._enqueue(queue, output, wait_for)
+
+    def _enqueue(self, queue, output, wait_for: list=None):
+        """
+        Enqueue a kernel run on a payload, without waiting for it.
+
+        The payload host data must not be modified until the run has been
+        completed with _complete().
+
+        Arguments:
+            queue (cl.Queue): Device queue.
+            output (KernelPayload): Input payload, which is overwritten with
+                the output.
+            wait_for (cl.Event[], optional): Events to complete before the
+                run starts on the device, e.g. those of a previous run.
 
+        Returns:
+            (int, cl.Event[], cl.Event[]): Workgroup size, events of the
+                run which are timed (host to device transfer and kernel),
+                and device to host transfer events.
+
+        Raises:
+            E_BAD_ARGS: If payload input does not match kernel arguments.
+        """
         kargs = output.kargs
 
         # Copy data from host to device.
-        elapsed += output.host_to_device(queue)
+        h2d = output.host_to_device(queue, wait_for=wait_for)
 
         # Try setting the kernel arguments.
         try:
@@ -596,13 +772,33 @@ class KernelDriver(clgen.CLgenObject):
         except Exception as e:
             raise E_BAD_ARGS(e)
 
-        # Execute kernel.
+        # Execute kernel, once the inputs have been copied. If there are no
+        # inputs to copy, the kernel itself must wait for wait_for.
         local_size_x = min(output.ndrange[0], 256)
-        event = self.kernel(queue, output.ndrange, (local_size_x,), *kargs)
-        elapsed += get_event_time(event)
+        event = self.kernel(queue, output.ndrange, (local_size_x,), *kargs,
+                            wait_for=h2d or wait_for)
+
+        # Copy data from device to host, once the kernel has completed.
+        d2h = output.device_to_host(queue, wait_for=[event])
+
+        return local_size_x, h2d + [event], d2h
 
-        # Copy data from device to host.
-        elapsed += output.device_to_host(queue)
+    def _complete(self, output, run):
+        """
+        Wait for a kernel run to complete, and record its profiling stats.
+
+        Arguments:
+            output (KernelPayload): Payload passed to _enqueue().
+            run ((int, cl.Event[], cl.Event[])): Value returned by
+                _enqueue().
+        """
+        local_size_x, timed, d2h = run
+
+        # Wait for everything to complete. The runtime recorded spans the
+        # host to device transfer and kernel execution. Device to host
+        # transfers are waited on, but not timed.
+        elapsed = get_events_time(timed)
+        get_events_time(d2h)
 
         # Record workgroup size.
         self.wgsizes.append(local_size_x)
@@ -611,12 +807,7 @@ class KernelDriver(clgen.CLgenObject):
         self.runtimes.append(elapsed)
 
         # Record transfers.
-        self.transfers.append(payload.transfersize)
-
-        # Check that everything is done before we finish:
-        queue.flush()
-
-        return output
+        self.transfers.append(output.transfersize)
 
     def __repr__(self) -> str:
         return self.source
@@ -661,12 +852,18 @@ class KernelDriver(clgen.CLgenObject):
         assert_constraint(A1in == A2in, E_BAD_DRIVER, "A1in != A2in")
         assert_constraint(B1in == B2in, E_BAD_DRIVER, "B1in != B2in")
 
-        # Run kernel.
-        k = partial(self, queue)
-        A1out = k(A1in)
-        B1out = k(B1in)
-        A2out = k(A2in)
-        B2out = k(B2in)
+        # Run kernel. All four runs are submitted before waiting on any of
+        # them. Each run waits on the previous one on the device, so that
+        # the runtimes recorded do not include overlapping runs.
+        runs = []
+        wait_for = None
+        for payload in (A1in, B1in, A2in, B2in):
+            output, run = self._submit(queue, payload, wait_for)
+            wait_for = run[1] + run[2]
+            runs.append((output, run))
+        for output, run in runs:
+            self._complete(output, run)
+        (A1out, _), (B1out, _), (A2out, _), (B2out, _) = runs
 
         # outputs must be different from inputs:
         assert_constraint(A1in != A1out, E_NO_OUTPUTS)
@@ -681,16 +878,34 @@ class KernelDriver(clgen.CLgenObject):
             assert_constraint(A1out != B1out, E_INPUT_INSENSITIVE)
 
     def profile(self, queue, size: int=16, must_validate: bool=False,
-                out=sys.stdout, metaout=sys.stderr, min_num_iterations: int=10):
+                out=sys.stdout, metaout=sys.stderr, min_num_iterations: int=10,
+                max_num_iterations: int=100, ci_threshold: float=0.05):
         """
         Run kernel and profile runtime.
 
+        The kernel is run at least min_num_iterations times, and then until
+        the confidence interval of the mean runtime is within ci_threshold
+        of the mean, or max_num_iterations runs have been recorded.
+
         Output format (CSV):
 
             out:      <kernel> <wgsize> <transfer> <runtime> <ci>
             metaout:  <error> <kernel>
+
+        Where <runtime> is the mean time in milliseconds from the host to
+        device transfer starting to kernel execution ending, and <ci> is
+        its confidence interval. Device to host transfers are not timed.
         """
         assert(isinstance(queue, cl.CommandQueue))
+        assert(min_num_iterations <= max_num_iterations)
+
+        def converged():
+            """ return whether the runtimes recorded so far are stable """
+            if len(self.runtimes) < max(min_num_iterations, 2):
+                return False
+            mean = labmath.mean(self.runtimes)
+            ci = labmath.confinterval(self.runtimes, array_mean=mean)[1] - mean
+            return ci <= ci_threshold * mean
 
         if must_validate:
             try:
@@ -699,10 +914,37 @@ class KernelDriver(clgen.CLgenObject):
                 print(type(e).__name__, self.name, sep=',', file=metaout)
 
         P = KernelPayload.create_random(self, size)
-        k = partial(self, queue)
 
-        while len(self.runtimes) < min_num_iterations:
-            k(P)
+        # Iterations alternate between two scratch copies of the payload,
+        # which are refilled from P in place, rather than allocating new
+        # host arrays and device buffers for every run. Each run is
+        # enqueued before waiting on the previous one, so that the device
+        # is kept busy while the host records results. A run does not start
+        # on the device until the previous run has completed, so that the
+        # runs being timed do not overlap, even on an out-of-order queue.
+        scratch = [deepcopy(P), deepcopy(P)]
+
+        pending = None
+        i = 0
+        while True:
+            # Enqueue another run, unless enough have been recorded or
+            # are in flight.
+            run = None
+            nruns = len(self.runtimes) + (1 if pending else 0)
+            if nruns < min_num_iterations or (
+                    nruns < max_num_iterations and not converged()):
+                payload = scratch[i % 2]
+                payload.reset_from(P)
+                wait_for = pending[1][1] + pending[1][2] if pending else None
+                run = payload, self._enqueue(queue, payload, wait_for)
+                i += 1
+
+            if pending:
+                self._complete(*pending)
+
+            pending = run
+            if not pending:
+                break
 
         wgsize = int(round(labmath.mean(self.wgsizes)))
         transfer = int(round(labmath.mean(self.transfers)))
@@ -731,6 +973,25 @@ class KernelDriver(clgen.CLgenObject):
         """ Kernel prototype instance. """
         return self._prototype
 
+    @property
+    def arg_specs(self):
+        """
+        Kernel argument properties used to create payloads.
+
+        A list of (arg, numpy_type, vector_width, is_pointer, is_local,
+        is_const) tuples, one per argument, where arg is the parsed
+        clutil.KernelArg of the driver's prototype.
+
+        Raises:
+            UnknownTypeException: If an argument type can't be deduced.
+        """
+        if self._arg_specs is None:
+            self._arg_specs = [
+                (a, a.numpy_type, a.vector_width, a.is_pointer,
+                 a.is_local, a.is_const)
+                for a in self.prototype.args]
+        return self._arg_specs
+
     @property
     def kernel(self):
         """ Kernel instance. """
@@ -761,6 +1022,10 @@ class KernelDriver(clgen.CLgenObject):
         """
         Compile an OpenCL program.
 
+        Compiled program binaries are cached on disk by pyopencl, keyed by
+        the source, build options, and device, so a kernel is JIT compiled
+        only once.
+
         Arguments:
             ctx (cl.Context): OpenCL context.
             src (str): Kernel source.
@@ -792,6 +1057,8 @@ def kernel(src, filename: str='<stdin>', devtype="__placeholder__",
 
         out:      <file> <size> <kernel> <wgsize> <transfer> <runtime> <ci>
         metaout:  <file> <size> <error> <kernel>
+
+    See KernelDriver.profile() for the definition of <runtime>.
     """
     # we have to use a string as a placeholder for the default type or else
     # module import will break when pyopencl is not installed:
@@ -799,7 +1066,9 @@ def kernel(src, filename: str='<stdin>', devtype="__placeholder__",
         devtype = cl.device_type.GPU
 
     try:
-        ctx, queue = init_opencl(devtype=devtype)
+        # KernelDriver expresses all dependencies between the commands it
+        # enqueues, so transfers and kernels may be executed out-of-order.
+        ctx, queue = init_opencl(devtype=devtype, out_of_order=True)
         driver = KernelDriver(ctx, src)
     except Exception as e:
         if fatal_errors:
@@ -819,11 +1088,13 @@ def kernel(src, filename: str='<stdin>', devtype="__placeholder__",
     stdout = out.getvalue()
     stderr = metaout.getvalue()
 
-    # Print results:
-    [print(filename, size, line, sep=',')
-     for line in stdout.split('\n') if line]
-    [print(filename, size, line, sep=',', file=sys.stderr)
-     for line in stderr.split('\n') if line]
+    # Print results, with a single write per stream:
+    sys.stdout.write("".join(
+        "{},{},{}\n".format(filename, size, line)
+        for line in stdout.split('\n') if line))
+    sys.stderr.write("".join(
+        "{},{},{}\n".format(filename, size, line)
+        for line in stderr.split('\n') if line))
 
 
 def file(path: str, **kwargs):
@@ -21,7 +21,10 @@ OpenCL utilities.
 """
 import numpy as np
 import re
+import sys
 
+from functools import lru_cache
+from multiprocessing import Pool
 from six import string_types
 
 import clgen
@@ -29,6 +32,40 @@ from clgen import config as cfg
 from clgen import log
 
 
+# Numpy types of OpenCL bare types.
+_NUMPY_TYPES = {
+    "bool": np.bool_,
+    "char": np.int8,
+    "double": np.float64,
+    "float": np.float32,
+    "half": np.uint8,
+    "int": np.int32,
+    "long": np.int64,
+    "short": np.int16,
+    "uchar": np.uint8,
+    "uint": np.uint32,
+    "ulong": np.uint64,
+    "unsigned char": np.uint8,
+    "unsigned int": np.uint32,
+    "unsigned long": np.uint64,
+    "unsigned short": np.uint16,
+    "ushort": np.uint16,
+    "void": np.int64,
+}
+
+# Keywords which mark a kernel argument as restrict.
+_RESTRICT_KEYWORDS = frozenset(("restrict", "__restrict"))
+
+# Matches a single parenthesis.
+_PARENS_RE = re.compile(r'[()]')
+
+# Matches a single brace.
+_BRACES_RE = re.compile(r'[{}]')
+
+# Matches the start of an OpenCL kernel.
+_KERNEL_RE = re.compile(r'__kernel')
+
+
 class OpenCLUtilException(clgen.CLgenError):
     """
     Module error.
@@ -56,34 +93,73 @@ class KernelArg(clgen.CLgenObject):
 
     *Note:* Requires source code to have been pre-processed.
     """
+    # Attributes parsed from the argument string.
+    _parsed = (
+        "_string", "_components", "_name", "_type", "_is_restrict",
+        "_qualifiers", "_is_pointer", "_is_vector", "_vector_width",
+        "_bare_type", "_numpy_type", "_is_const", "_is_global",
+        "_is_local")
+
+    # Payload attributes, set by cldrive.
+    __slots__ = _parsed + ("hostdata", "devdata", "flags", "bufsize")
+
     def __init__(self, string):
         """
         Create a kernel argument from a string.
 
+        The string is parsed once, here, and all properties are computed
+        up front.
+
         Arguments:
             string (str): OpenCL argument string.
+
+        Raises:
+            PrototypeException: If the string can't be parsed.
         """
         assert(isinstance(string, string_types))
 
         self._string = string.strip()
-        self._components = self._string.split()
 
-        try:
-            if "restrict" in self._components:
-                self._is_restrict = True
-                self._components.remove("restrict")
-            elif "__restrict" in self._components:
-                self._is_restrict = True
-                self._components.remove("__restrict")
-            else:
-                self._is_restrict = False
+        # Split into components, dropping restrict keywords:
+        tokens = self._string.split()
+        self._components = [t for t in tokens if t not in _RESTRICT_KEYWORDS]
+        self._is_restrict = len(self._components) != len(tokens)
 
+        try:
             if "unsigned" in self._components:
                 self._components.remove("unsigned")
                 self._components[-2] = "unsigned " + self._components[-2]
+
+            self._name = self._components[-1]
+            # Types and qualifiers come from a small vocabulary, so are
+            # interned to share one copy of each string:
+            self._type = sys.intern(self._components[-2])
+            self._qualifiers = tuple(sys.intern(q)
+                                     for q in self._components[:-2])
+
+            self._is_pointer = self._type[-1] == '*'
+            idx = -2 if self._is_pointer else -1
+            self._is_vector = self._type[idx].isdigit()
         except Exception as e:
             raise PrototypeException(e)
 
+        # Split the type into bare type and vector width, with a single
+        # scan over the trailing digits, e.g. "float4*" -> "float", 4:
+        t = self._type[:-1] if self._is_pointer else self._type
+        i = len(t)
+        while i and t[i - 1] in '0123456789':
+            i -= 1
+        self._vector_width = int(t[i:]) if self._is_vector else 1
+        self._bare_type = sys.intern(t[:i])
+        # None if unknown. The numpy_type property raises on access.
+        self._numpy_type = _NUMPY_TYPES.get(self._bare_type)
+
+        self._is_const = 'const' in self._qualifiers
+        self._is_global = ('__global' in self._qualifiers or
+                           'global' in self._qualifiers)
+        self._is_local = ('__local' in self._qualifiers or
+                          'local' in self._qualifiers)
+
 
     @property
     def string(self) -> str:
@@ -134,7 +210,7 @@ class KernelArg(clgen.CLgenObject):
         Returns:
             str: Argument name.
         """
-        return self._components[-1]
+        return self._name
 
     @property
     def type(self) -> str:
@@ -151,7 +227,7 @@ class KernelArg(clgen.CLgenObject):
         Returns:
             str: Argument type, including pointer '*' symbol, if present.
         """
-        return self._components[-2]
+        return self._type
 
     @property
     def is_restrict(self) -> bool:
@@ -171,21 +247,21 @@ class KernelArg(clgen.CLgenObject):
         return self._is_restrict
 
     @property
-    def qualifiers(self) -> float:
+    def qualifiers(self) -> tuple:
         """
         Return all argument type qualifiers.
 
         Examples:
 
             >>> KernelArg("__global float4* a").qualifiers
-            ["__global"]
+            ("__global",)
             >>> KernelArg("const int b").qualifiers
-            ["const"]
+            ("const",)
 
         Returns:
-            str[]: Type qualifiers.
+            tuple of str: Type qualifiers.
         """
-        return self._components[:-2]
+        return self._qualifiers
 
     @property
     def is_pointer(self) -> bool:
@@ -202,7 +278,7 @@ class KernelArg(clgen.CLgenObject):
         Returns:
             bool: True if pointer, else False.
         """
-        return self.type[-1] == '*'
+        return self._is_pointer
 
     @property
     def is_vector(self) -> bool:
@@ -219,8 +295,7 @@ class KernelArg(clgen.CLgenObject):
         Returns:
             bool: True if vector type, else False.
         """
-        idx = -2 if self.is_pointer else -1
-        return self.type[idx].isdigit()
+        return self._is_vector
 
     @property
     def vector_width(self) -> int:
@@ -239,15 +314,7 @@ class KernelArg(clgen.CLgenObject):
         Returns:
             int: Vector width.
         """
-        try:
-            return self._vector_width
-        except AttributeError:  # set
-            if self.is_vector:
-                m = re.search(r'([0-9]+)\*?$', self.type)
-                self._vector_width = int(m.group(1))
-            else:
-                self._vector_width = 1
-            return self._vector_width
+        return self._vector_width
 
     @property
     def bare_type(self) -> float:
@@ -264,11 +331,7 @@ class KernelArg(clgen.CLgenObject):
         Returns:
             str: Bare type.
         """
-        try:
-            return self._bare_type
-        except AttributeError:  # set
-            self._bare_type = re.sub(r'([0-9]+)?\*?$', '', self.type)
-            return self._bare_type
+        return self._bare_type
 
     @property
     def is_const(self) -> bool:
@@ -285,11 +348,7 @@ class KernelArg(clgen.CLgenObject):
         Returns:
             bool: True if const, else False.
         """
-        try:
-            return self._is_const
-        except AttributeError:  # set
-            self._is_const = True if 'const' in self.qualifiers else False
-            return self._is_const
+        return self._is_const
 
     @property
     def is_global(self) -> bool:
@@ -306,13 +365,7 @@ class KernelArg(clgen.CLgenObject):
         Returns:
             bool: True if global, else False.
         """
-        try:
-            return self._is_global
-        except AttributeError:  # set
-            self._is_global = (
-                True if '__global' in self.qualifiers or
-                'global' in self.qualifiers else False)
-            return self._is_global
+        return self._is_global
 
     @property
     def is_local(self) -> bool:
@@ -329,13 +382,7 @@ class KernelArg(clgen.CLgenObject):
         Returns:
             bool: True if local, else False.
         """
-        try:
-            return self._is_local
-        except AttributeError:  # set
-            self._is_local = (
-                True if '__local' in self.qualifiers or
-                'local' in self.qualifiers else False)
-            return self._is_local
+        return self._is_local
 
     @property
     def numpy_type(self):
@@ -357,28 +404,104 @@ class KernelArg(clgen.CLgenObject):
 
             UnknownTypeException: If type can't be deduced.
         """
-        np_type = {
-            "bool": np.bool_,
-            "char": np.int8,
-            "double": np.float64,
-            "float": np.float32,
-            "half": np.uint8,
-            "int": np.int32,
-            "long": np.int64,
-            "short": np.int16,
-            "uchar": np.uint8,
-            "uint": np.uint32,
-            "ulong": np.uint64,
-            "unsigned char": np.uint8,
-            "unsigned int": np.uint32,
-            "unsigned long": np.uint64,
-            "unsigned short": np.uint16,
-            "ushort": np.uint16,
-            "void": np.int64,
-        }.get(self.bare_type, None)
-        if np_type is None:
+        if self._numpy_type is None:
             raise UnknownTypeException(self.type)
-        return np_type
+        return self._numpy_type
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def get(string: str):
+        """
+        Get a shared kernel argument instance for a string.
+
+        Equal strings return the same instance, so each distinct string is
+        parsed once. Shared instances must not be modified, e.g. by setting
+        payload attributes; use the constructor or shallow_clone() for that.
+        Call KernelArg.get.cache_clear() to release cached instances.
+
+        Arguments:
+            string (str): OpenCL argument string.
+
+        Returns:
+            KernelArg: Kernel argument.
+
+        Raises:
+            PrototypeException: If the string can't be parsed.
+        """
+        return KernelArg(string)
+
+    @staticmethod
+    def parse_many(strings) -> np.recarray:
+        """
+        Parse many kernel argument strings into a table of properties.
+
+        Each distinct string is parsed once, see get().
+
+        Examples:
+
+            >>> args = KernelArg.parse_many(["__global float4* a", "int b"])
+            >>> args.vector_width
+            array([4, 1], dtype=int32)
+            >>> args.is_global
+            array([ True, False])
+
+        Arguments:
+            strings (str[]): OpenCL argument strings.
+
+        Returns:
+            np.recarray: One record per string, with fields name, type,
+                bare_type, is_restrict, is_pointer, is_vector, vector_width,
+                is_const, is_global, and is_local.
+
+        Raises:
+            PrototypeException: If a string can't be parsed.
+        """
+        return KernelArg._table([KernelArg.get(string) for string in strings])
+
+    @staticmethod
+    def _table(args) -> np.recarray:
+        """
+        Tabulate the properties of parsed kernel arguments.
+
+        Arguments:
+            args (KernelArg[]): Kernel arguments.
+
+        Returns:
+            np.recarray: One record per argument, see parse_many().
+        """
+        def column(attr, dtype):
+            return np.array([getattr(arg, attr) for arg in args], dtype=dtype)
+
+        return np.rec.fromarrays([
+            column("_name", object),
+            column("_type", object),
+            column("_bare_type", object),
+            column("_is_restrict", np.bool_),
+            column("_is_pointer", np.bool_),
+            column("_is_vector", np.bool_),
+            column("_vector_width", np.int32),
+            column("_is_const", np.bool_),
+            column("_is_global", np.bool_),
+            column("_is_local", np.bool_),
+        ], names=[
+            "name", "type", "bare_type", "is_restrict", "is_pointer",
+            "is_vector", "vector_width", "is_const", "is_global", "is_local",
+        ])
+
+    def shallow_clone(self):
+        """
+        Create a copy of the argument, without re-parsing the string.
+
+        Parsed properties are copied. Payload attributes are not copied.
+
+        Returns:
+            KernelArg: Copy of argument.
+        """
+        clone = KernelArg.__new__(KernelArg)
+        for attr in KernelArg._parsed:
+            setattr(clone, attr, getattr(self, attr))
+        clone._components = list(self._components)
+        return clone
 
     def __repr__(self):
         return self._string
@@ -399,7 +522,13 @@ class KernelPrototype(clgen.CLgenObject):
         Arguments:
             string (str): Prototype string.
         """
-        self._string = ' '.join(string.split())
+        # Collapse whitespace. Most prototypes are already on a single line
+        # with single spaces, and are used as is:
+        if (string.isprintable() and '  ' not in string and
+                string[:1] != ' ' and string[-1:] != ' '):
+            self._string = string
+        else:
+            self._string = ' '.join(string.split())
         if not self._string.startswith('__kernel void '):
             raise PrototypeException('malformed prototype', self._string)
 
@@ -425,12 +554,12 @@ class KernelPrototype(clgen.CLgenObject):
             return self._name
 
     @property
-    def args(self) -> list:
+    def args(self) -> tuple:
         """
         Kernel arguments.
 
         Returns:
-            KernelArg[]: Kernel arguments.
+            tuple of KernelArg: Kernel arguments.
         """
         try:
             return self._args
@@ -440,11 +569,71 @@ class KernelPrototype(clgen.CLgenObject):
             inner_brace = self._string[idx_open_brace + 1:idx_close_brace].strip()
             # Add special case for prototypes which have no args:
             if not inner_brace or inner_brace == 'void':
-                self._args = []
+                self._args = ()
             else:
-                self._args = [KernelArg(x) for x in inner_brace.split(',')]
+                self._args = tuple(KernelArg.get(x.strip())
+                                   for x in inner_brace.split(','))
             return self._args
 
+    @property
+    def arg_table(self) -> np.recarray:
+        """
+        Kernel argument properties, as columns.
+
+        The table is read-only, since prototypes are shared by
+        from_source().
+
+        Returns:
+            np.recarray: One record per argument, see KernelArg.parse_many().
+        """
+        try:
+            return self._arg_table
+        except AttributeError:  # set
+            table = KernelArg._table(self.args)
+            table.flags.writeable = False
+            self._arg_table = table
+            return self._arg_table
+
+    @property
+    def arg_names(self) -> tuple:
+        """
+        Kernel argument names.
+
+        Returns:
+            tuple of str: Argument names.
+        """
+        return tuple(self.arg_table.name)
+
+    @property
+    def arg_types(self) -> tuple:
+        """
+        Kernel argument types.
+
+        Returns:
+            tuple of str: Argument types.
+        """
+        return tuple(self.arg_table.type)
+
+    @property
+    def arg_is_global(self) -> np.array:
+        """
+        Whether each kernel argument is global.
+
+        Returns:
+            np.array of bool: True for global arguments.
+        """
+        return self.arg_table.is_global
+
+    @property
+    def arg_is_local(self) -> np.array:
+        """
+        Whether each kernel argument is local.
+
+        Returns:
+            np.array of bool: True for local arguments.
+        """
+        return self.arg_table.is_local
+
     @property
     def is_synthesizable(self) -> bool:
         for arg in self.args:
@@ -458,10 +647,15 @@ class KernelPrototype(clgen.CLgenObject):
         return self._string
 
     @staticmethod
+    @lru_cache(maxsize=1024)
     def from_source(src: str):
         """
         Create KernelPrototype from OpenCL kernel source.
 
+        Prototypes are cached by source, so equal sources return the same
+        instance. Call KernelPrototype.from_source.cache_clear() to release
+        cached instances.
+
         Argument:
             src (str): OpenCL kernel source.
 
@@ -484,14 +678,13 @@ def get_attribute_range(src: str, start_idx: int) -> tuple:
     """
     i = src.find('(', start_idx) + 1
     d = 1
-    while i < len(src) and d > 0:
-        if src[i] == '(':
-            d += 1
-        elif src[i] == ')':
-            d -= 1
-        i += 1
+    # Jump between parentheses, rather than stepping over every character:
+    for match in _PARENS_RE.finditer(src, i):
+        d += 1 if match.group() == '(' else -1
+        if not d:
+            return (start_idx, match.end())
 
-    return (start_idx, i)
+    return (start_idx, len(src))
 
 
 def strip_attributes(src: str) -> str:
@@ -504,16 +697,17 @@ def strip_attributes(src: str) -> str:
     Returns:
         str: OpenCL source, with ((attributes)) removed.
     """
-    # get list of __attribute__ substrings
-    idxs = sorted(clgen.get_substring_idxs('__attribute__', src))
-
-    # get ((attribute)) ranges
-    attribute_ranges = [get_attribute_range(src, i) for i in idxs]
-
-    # remove ((atribute)) ranges
-    for r in reversed(attribute_ranges):
-        src = src[:r[0]] + src[r[1]:]
-    return src
+    # copy the source between __attribute__((...)) ranges
+    parts = []
+    i = 0
+    while True:
+        j = src.find('__attribute__', i)
+        if j < 0:
+            break
+        parts.append(src[i:j])
+        i = max(get_attribute_range(src, j)[1], j + len('__attribute__'))
+    parts.append(src[i:])
+    return ''.join(parts)
 
 
 def get_cl_kernel_end_idx(src: str, start_idx: int=0, max_len: int=5000) -> int:
@@ -532,14 +726,14 @@ def get_cl_kernel_end_idx(src: str, start_idx: int=0, max_len: int=5000) -> int:
         int: Index of end of OpenCL kernel.
     """
     i = src.find('{', start_idx) + 1
+    end = min(len(src), start_idx + max_len)
     d = 1  # depth
-    while i < min(len(src), start_idx + max_len) and d > 0:
-        if src[i] == '{':
-            d += 1
-        elif src[i] == '}':
-            d -= 1
-        i += 1
-    return i
+    # Jump between braces, rather than stepping over every character:
+    for match in _BRACES_RE.finditer(src, i, end):
+        d += 1 if match.group() == '{' else -1
+        if not d:
+            return match.end()
+    return max(i, end)
 
 
 def get_cl_kernel(src: str, start_idx: int, max_len: int=5000) -> str:
@@ -571,7 +765,7 @@ def get_cl_kernels(src: str) -> list:
 
         str[]: OpenCL kernels.
     """
-    idxs = clgen.get_substring_idxs('__kernel', src)
+    idxs = [match.start() for match in _KERNEL_RE.finditer(src)]
     kernels = [get_cl_kernel(src, i) for i in idxs]
     return kernels
 
@@ -588,19 +782,53 @@ def extract_prototype(src: str) -> KernelPrototype:
 
         KernelPrototype: Prototype instance.
     """
-    idxs = clgen.get_substring_idxs('__kernel void ', src)
-    if len(idxs) != 1:
+    nkernels = src.count('__kernel void ')
+    if nkernels != 1:
         raise PrototypeException("Invalid number of kernels found: {}"
-                                 .format(len(idxs)))
-    src = get_cl_kernel(src, idxs[0])
+                                 .format(nkernels))
 
-    try:
-        index = src.index('{') + 1
-        prototype = src[:index]
-    except ValueError:
+    # The prototype runs up to the opening brace of the kernel body:
+    start = src.find('__kernel void ')
+    end = src.find('{', start)
+    if end < 0:
         raise PrototypeException("malformed seed")
 
-    return KernelPrototype(prototype)
+    return KernelPrototype(src[start:end + 1])
+
+
+def _parse_prototype(src: str):
+    """
+    Extract kernel prototype, or None if not possible.
+
+    Arguments:
+        src (str): OpenCL source.
+
+    Returns:
+        KernelPrototype: Prototype instance, or None.
+    """
+    try:
+        return KernelPrototype.from_source(src)
+    except PrototypeException:
+        return None
+
+
+def parse_corpus(sources, workers: int=None, chunksize: int=64) -> list:
+    """
+    Extract kernel prototypes from many OpenCL sources, in parallel.
+
+    Arguments:
+        sources (str[]): OpenCL sources.
+        workers (int, optional): Number of worker processes. Default: the
+            number of CPUs.
+        chunksize (int, optional): Number of sources sent to a worker at a
+            time.
+
+    Returns:
+        KernelPrototype[]: Prototypes, in the same order as sources. None
+            for sources which do not contain exactly one kernel prototype.
+    """
+    with Pool(workers) as pool:
+        return list(pool.imap(_parse_prototype, sources, chunksize))
 
 
 def get_contexts_and_devices() -> dict:
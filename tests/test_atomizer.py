@@ -18,6 +18,8 @@
 #
 from unittest import TestCase, main, skip
 
+import pickle
+
 from clgen import atomizer
 
 class TestCharacterAtomizer(TestCase):
@@ -37,6 +39,19 @@ class TestCharacterAtomizer(TestCase):
         with self.assertRaises(atomizer.VocabError):
             c.atomize('abcdeabc')
 
+    def test_atomize_unicode(self):
+        c = atomizer.CharacterAtomizer({'a': 0, 'é': 1, '€': 2})
+        self.assertListEqual([0, 1, 2, 0], list(c.atomize('aé€a')))
+        with self.assertRaises(atomizer.VocabError):
+            c.atomize('aü')
+
+    def test_atomize_iter(self):
+        c = atomizer.CharacterAtomizer({'a': 1, 'b': 2, 'c': 3})
+        chunks = list(c.atomize_iter(['ab', 'ca', 'bc', 'a'], chunk_size=3))
+        self.assertEqual(2, len(chunks))
+        self.assertListEqual([1, 2, 3, 1, 2, 3, 1],
+                             [x for chunk in chunks for x in chunk])
+
     def test_deatomize(self):
         c = atomizer.CharacterAtomizer({'a': 1, 'b': 2, 'c': 3})
         self.assertEqual('abcabc', c.deatomize([1, 2, 3, 1, 2, 3]))
@@ -56,6 +71,11 @@ __kernel void A(__global float* a, const int b, const double c) {
         with self.assertRaises(atomizer.VocabError):
             c.deatomize([1, 2, 5, 10, 0])
 
+    def test_deatomize_negative_index(self):
+        c = atomizer.CharacterAtomizer({'a': 0, 'b': 1})
+        with self.assertRaises(atomizer.VocabError):
+            c.deatomize([-1])
+
 
 class TestGreedyAtomizer(TestCase):
     def test_tokeize1(self):
@@ -74,6 +94,15 @@ class TestGreedyAtomizer(TestCase):
         c = atomizer.GreedyAtomizer(test_vocab)
         self.assertListEqual(test_out, list(c.tokenize(test_in)))
 
+    def test_tokenize_longest_match(self):
+        # Partial matches of a longer atom must fall back to the longest
+        # complete atom, and not skip any characters.
+        test_vocab = {'abcd': 0, 'ab': 1, 'a': 2, 'b': 3, 'c': 4, 'd': 5}
+        test_in = 'abcabcdabcaabc'
+        test_out = ['ab', 'c', 'abcd', 'ab', 'c', 'a', 'ab', 'c']
+        c = atomizer.GreedyAtomizer(test_vocab)
+        self.assertListEqual(test_out, c.tokenize(test_in))
+
     def test_tokenize3(self):
         test_in = """\
 __kernel void A(__global float* a, __global float* b, const int c) {
@@ -96,6 +125,16 @@ __kernel void A(__global float* a, __global float* b, const int c) {
         c = atomizer.GreedyAtomizer.from_text(test_in)
         self.assertListEqual(test_out, c.tokenize(test_in))
 
+    def test_atomize_iter(self):
+        test_vocab = {'abc': 1, 'a': 2, 'b': 3, 'ab': 4, 'c': 5, 'cab': 6}
+        test_in = 'abcababbaabcabcaabccccabcabccabcccabcabc'
+        c = atomizer.GreedyAtomizer(test_vocab)
+        for chunk_size in range(1, len(test_in) + 2):
+            text_iter = (test_in[i:i + 2] for i in range(0, len(test_in), 2))
+            chunks = list(c.atomize_iter(text_iter, chunk_size=chunk_size))
+            self.assertListEqual(list(c.atomize(test_in)),
+                                 [x for chunk in chunks for x in chunk])
+
     def test_deatomize(self):
         test_in = """\
 __kernel void A(__global float* a, __global float* b, const int c) {
@@ -127,6 +166,33 @@ __kernel void A(__global float* a, __global float* b, const int c) {
         self.assertCountEqual(tokens, c.atoms)
         self.assertEqual(len(tokens), c.vocab_size)
 
+    def test_opencl_atoms_newlines(self):
+        # _opencl_unique_tokens() relies on this to split texts at newlines.
+        for atom in atomizer.OPENCL_ATOMS:
+            if len(atom) > 1:
+                self.assertNotIn('\n', atom)
+
+    def test_opencl_unique_tokens(self):
+        text = """\
+__kernel void A(__global float* a, __global float* b, const int c) {
+  int d = get_global_id(0);
+  if (d < c) {
+    a[d] = b[d] * 10.0f;
+  }
+}
+""" * 8
+        c = atomizer._opencl_atomizer()
+        self.assertEqual(
+            atomizer._unique_tokens(c, text),
+            atomizer._opencl_unique_tokens(text, n_workers=2, min_text_len=0))
+
+    def test_pickle(self):
+        c = atomizer.GreedyAtomizer({'abc': 0, 'a': 1, 'b': 2, 'c': 3})
+        d = pickle.loads(pickle.dumps(c))
+        self.assertEqual(c.vocab, d.vocab)
+        self.assertEqual(c.atoms, d.atoms)
+        self.assertListEqual(['abc', 'a', 'b'], d.tokenize('abcab'))
+
 
 if __name__ == "__main__":
     main()
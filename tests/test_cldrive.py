@@ -270,15 +270,45 @@ class TestKernelDriver(TestCase):
     def test_profile(self):
         driver = cldrive.KernelDriver(self._ctx, source1)
         driver.profile(self._queue)
-        self.assertEqual(10, len(driver.runtimes))
+        self.assertGreaterEqual(len(driver.runtimes), 10)
+        self.assertLessEqual(len(driver.runtimes), 100)
 
         driver = cldrive.KernelDriver(self._ctx, source2)
         driver.profile(self._queue)
-        self.assertEqual(10, len(driver.runtimes))
+        self.assertGreaterEqual(len(driver.runtimes), 10)
+        self.assertLessEqual(len(driver.runtimes), 100)
 
         driver = cldrive.KernelDriver(self._ctx, source3)
         driver.profile(self._queue)
-        self.assertEqual(10, len(driver.runtimes))
+        self.assertGreaterEqual(len(driver.runtimes), 10)
+        self.assertLessEqual(len(driver.runtimes), 100)
+
+    def test_init_opencl_in_order(self):
+        ooo = cl.command_queue_properties.OUT_OF_ORDER_EXEC_MODE_ENABLE
+        properties = self._queue.get_info(cl.command_queue_info.PROPERTIES)
+        self.assertFalse(properties & ooo)
+
+    def test_out_of_order(self):
+        ctx, queue = cldrive.init_opencl(devtype=self._devtype,
+                                         out_of_order=True)
+        driver = cldrive.KernelDriver(ctx, source1)
+
+        A = cldrive.KernelPayload.create_sequential(driver, 16)
+        B = driver(queue, A)
+        self.assertNotEqual(A, B)
+        self.assertEqual(B, driver(queue, A))
+
+        driver.validate(queue, size=16)
+
+        driver = cldrive.KernelDriver(ctx, source1)
+        driver.profile(queue, min_num_iterations=5, max_num_iterations=5)
+        self.assertEqual(5, len(driver.runtimes))
+
+    def test_profile_max_num_iterations(self):
+        driver = cldrive.KernelDriver(self._ctx, source1)
+        driver.profile(self._queue, min_num_iterations=5,
+                       max_num_iterations=5)
+        self.assertEqual(5, len(driver.runtimes))
 
 
 @skipIf(not cfg.USE_OPENCL, "no OpenCL")
@@ -334,3 +364,22 @@ class TestKernelPayload(TestCase):
         p6 = cldrive.KernelPayload.create_random(self._driver1, 8)
         self.assertNotEqual(p1, p5)
         self.assertNotEqual(p5, p6)
+
+    def test_deepcopy(self):
+        p1 = cldrive.KernelPayload.create_sequential(self._driver1, 8)
+        p2 = deepcopy(p1)
+        self.assertEqual(p1, p2)
+
+        p2.args[0].hostdata[0] += 1
+        self.assertNotEqual(p1, p2)
+        self.assertNotEqual(p1.args[0].devdata, p2.args[0].devdata)
+
+    def test_reset_from(self):
+        p1 = cldrive.KernelPayload.create_sequential(self._driver1, 8)
+        p2 = cldrive.KernelPayload.create_random(self._driver1, 8)
+        self.assertNotEqual(p1, p2)
+
+        devdata = [a.devdata for a in p2.args]
+        p2.reset_from(p1)
+        self.assertEqual(p1, p2)
+        self.assertEqual(devdata, [a.devdata for a in p2.args])
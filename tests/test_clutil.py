@@ -29,6 +29,10 @@ from labm8 import fs
 import clgen
 from clgen import clutil
 
+# The tests in this module share no state, so nose's multiprocess plugin
+# may split them across worker processes (nosetests --processes=N).
+_multiprocess_can_split_ = True
+
 source1 = """
 __kernel void A(__global float* a,    __global float* b, const int c) {
     int d = get_global_id(0);
@@ -80,7 +84,7 @@ test_arg_names = [['a', 'b', 'c'], ['a', 'b', 'c'], ['a', 'b', 'c', 'd']]
 test_arg_types = [['float*', 'float*', 'int'],
                   ['float*', 'float*', 'int*'],
                   ['int*', 'int*', 'int', 'int']]
-test_inputs = zip(test_sources, test_prototypes)
+test_inputs = tuple(zip(test_sources, test_prototypes))
 
 
 class TestOpenCLUtil(TestCase):
@@ -89,6 +93,12 @@ class TestOpenCLUtil(TestCase):
             self.assertEqual(prototype,
                              str(clutil.extract_prototype(source)))
 
+    def test_parse_corpus(self):
+        prototypes = clutil.parse_corpus(test_sources + ["int A;"], workers=2)
+        self.assertEqual(test_prototypes, [str(p) for p in prototypes[:-1]])
+        self.assertEqual(["a", "b", "c"], [x.name for x in prototypes[0].args])
+        self.assertIsNone(prototypes[-1])
+
     def test_strip_attributes(self):
         self.assertEqual("", clutil.strip_attributes(
             "__attribute__((reqd_work_group_size(64,1,1)))"))
@@ -112,40 +122,59 @@ class TestOpenCLUtil(TestCase):
 
 
 class TestKernelPrototype(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.prototypes = [clutil.KernelPrototype.from_source(source)
+                          for source in test_sources]
+
     def test_from_source(self):
         for source, prototype in test_inputs:
             self.assertEqual(prototype,
                              str(clutil.KernelPrototype.from_source(source)))
 
+    def test_from_source_cached(self):
+        p = clutil.KernelPrototype.from_source(source1)
+        self.assertIs(p, clutil.KernelPrototype.from_source(source1))
+        self.assertIsNot(p, clutil.KernelPrototype.from_source(source2))
+
     def test_name(self):
-        for source, name in zip(test_sources, test_names):
-            p = clutil.KernelPrototype.from_source(source)
-            self.assertEqual(name, p.name)
+        self.assertEqual(test_names, [p.name for p in self.prototypes])
 
     def test_args(self):
-        for source, args in zip(test_sources, test_args):
-            p = clutil.KernelPrototype.from_source(source)
-            self.assertEqual(args, [str(x) for x in p.args])
+        self.assertEqual(test_args, [[str(x) for x in p.args]
+                                     for p in self.prototypes])
 
     def test_args_names(self):
-        for source, argnames in zip(test_sources, test_arg_names):
-            p = clutil.KernelPrototype.from_source(source)
-            self.assertEqual(argnames, [x.name for x in p.args])
+        self.assertEqual(test_arg_names, [[x.name for x in p.args]
+                                          for p in self.prototypes])
 
     def test_args_types(self):
-        for source, type in zip(test_sources, test_arg_types):
-            p = clutil.KernelPrototype.from_source(source)
-            self.assertEqual(type, [x.type for x in p.args])
+        self.assertEqual(test_arg_types, [[x.type for x in p.args]
+                                          for p in self.prototypes])
 
     def test_args_is_global(self):
-        for source, isglobal in zip(test_sources, test_arg_globals):
-            p = clutil.KernelPrototype.from_source(source)
-            self.assertEqual(isglobal, [x.is_global for x in p.args])
+        self.assertEqual(test_arg_globals, [[x.is_global for x in p.args]
+                                            for p in self.prototypes])
 
     def test_args_is_local(self):
-        for source, islocal in zip(test_sources, test_arg_locals):
-            p = clutil.KernelPrototype.from_source(source)
-            self.assertEqual(islocal, [x.is_local for x in p.args])
+        self.assertEqual(test_arg_locals, [[x.is_local for x in p.args]
+                                           for p in self.prototypes])
+
+    def test_arg_columns(self):
+        for i, p in enumerate(self.prototypes):
+            self.assertEqual(tuple(test_arg_names[i]), p.arg_names)
+            self.assertEqual(tuple(test_arg_types[i]), p.arg_types)
+            self.assertEqual(test_arg_globals[i], p.arg_is_global.tolist())
+            self.assertEqual(test_arg_locals[i], p.arg_is_local.tolist())
+
+    def test_arg_columns_readonly(self):
+        p = clutil.KernelPrototype.from_source(test_sources[0])
+        with self.assertRaises(ValueError):
+            p.arg_is_global[0] = False
+        with self.assertRaises(ValueError):
+            p.arg_is_local[0] = True
+        p = clutil.KernelPrototype.from_source(test_sources[0])
+        self.assertEqual(test_arg_globals[0], p.arg_is_global.tolist())
 
 
 class TestKernelArg(TestCase):
@@ -185,9 +214,10 @@ class TestKernelArg(TestCase):
 
     def test_qualifiers(self):
         self.assertEqual(
-            clutil.KernelArg("__global float4* a").qualifiers, ["__global"])
-        self.assertEqual(clutil.KernelArg("const int b").qualifiers, ["const"])
-        self.assertEqual(clutil.KernelArg("int c").qualifiers, [])
+            clutil.KernelArg("__global float4* a").qualifiers, ("__global",))
+        self.assertEqual(
+            clutil.KernelArg("const int b").qualifiers, ("const",))
+        self.assertEqual(clutil.KernelArg("int c").qualifiers, ())
 
     def test_is_pointer(self):
         self.assertTrue(clutil.KernelArg("__global float4* a").is_pointer)
@@ -225,6 +255,43 @@ class TestKernelArg(TestCase):
             clutil.KernelArg("__local float4* a").numpy_type, np.float32)
         self.assertEqual(clutil.KernelArg("const int b").numpy_type, np.int32)
 
+    def test_get(self):
+        a = clutil.KernelArg.get("__global float4* a")
+        self.assertIs(a, clutil.KernelArg.get("__global float4* a"))
+        self.assertEqual("float4*", a.type)
+        self.assertIsNot(a, clutil.KernelArg.get("const int b"))
+
+        clutil.KernelArg.get.cache_clear()
+        self.assertIsNot(a, clutil.KernelArg.get("__global float4* a"))
+
+    def test_parse_many(self):
+        args = clutil.KernelArg.parse_many(
+            ["__global float4* a", "const int b", "__local uchar16* c"])
+        self.assertEqual(["a", "b", "c"], args.name.tolist())
+        self.assertEqual(["float4*", "int", "uchar16*"], args.type.tolist())
+        self.assertEqual(["float", "int", "uchar"], args.bare_type.tolist())
+        self.assertEqual([4, 1, 16], args.vector_width.tolist())
+        self.assertEqual([True, False, True], args.is_pointer.tolist())
+        self.assertEqual([False, True, False], args.is_const.tolist())
+        self.assertEqual([True, False, False], args.is_global.tolist())
+        self.assertEqual([False, False, True], args.is_local.tolist())
+
+        self.assertEqual(0, len(clutil.KernelArg.parse_many([])))
+
+    def test_shallow_clone(self):
+        a = clutil.KernelArg("const __restrict unsigned int z")
+        self.assertEqual(1, a.vector_width)
+        a.hostdata = 1
+        b = a.shallow_clone()
+        self.assertEqual(a.string, b.string)
+        self.assertEqual(a.components, b.components)
+        self.assertIsNot(a.components, b.components)
+        self.assertEqual("unsigned int", b.type)
+        self.assertTrue(b.is_restrict)
+        self.assertTrue(b.is_const)
+        self.assertEqual(1, b.vector_width)
+        self.assertFalse(hasattr(b, "hostdata"))
+
     def test_arg(self):
         a = clutil.KernelArg("__global float* a")
         self.assertEqual("float*", a.type)